@@ -1,28 +1,286 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import CodeType
+import contextlib
+import email.utils
+import errno
+import io
+import mmap
+import multiprocessing
 import os
-import subprocess  # More secure than os.popen2
-from typing import List, Type  # For type hints
+import queue
+import selectors
+import signal
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+# For type hints
+from typing import (Deque, Dict, List, Optional, Sequence, Tuple,
+                    Type)
+
+# Directory files are served from, fixed at startup
+DOCROOT = os.getcwd()
+DOCROOT_SEP = os.path.join(DOCROOT, '')
+
+# Appended to a directory's path to find its index page
+INDEX_SUFFIX = os.sep + 'index.html'
+
+# Chunk size used when a file has to be copied through user space
+BUF_SIZE = 8 * 1024 if os.name == 'nt' else 64 * 1024
+
+# Flags for opening files to serve (O_BINARY only exists on Windows)
+OPEN_FLAGS = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+
+# Files larger than this bypass the page cache with O_DIRECT, so one big
+# download does not evict the hotter, smaller files
+DIRECT_IO_MIN = 64 * 1024 * 1024
+
+# Buffer address and file offset alignment required by O_DIRECT reads
+DIRECT_IO_ALIGN = 4096
+
+# Files with these suffixes are run as CGI scripts instead of served
+CGI_SUFFIXES = ('.py',)
+
+# Seconds to wait for a CGI script's output
+CGI_TIMEOUT = 30
+
+# Worker processes in each server process's CGI pool
+CGI_WORKERS = os.cpu_count() or 1
+
+# CGI output up to this size comes back over the pool's pipe; larger
+# output is written to a file in the temp directory and sent with sendfile
+CGI_MEMORY_LIMIT = 1024 * 1024
+
+# Content types by lower-cased file extension
+MIME_TYPES = {
+    '.html': b'text/html',
+    '.css': b'text/css',
+    '.js': b'application/javascript',
+    '.png': b'image/png',
+    '.jpg': b'image/jpeg',
+    '.jpeg': b'image/jpeg',
+}
+
+# Holds back partial segments while a response is written
+# (TCP_NOPUSH on BSD and macOS; None where neither exists)
+TCP_CORK = getattr(socket, 'TCP_CORK', getattr(socket, 'TCP_NOPUSH', None))
+
+# Bodies up to this size are joined with their headers into one write
+COALESCE_LIMIT = 64 * 1024
 
 class ServerException(Exception):
     """Custom exception for server errors."""
     pass
 
+class FileCache:
+    """
+    Bounded LRU of small file contents, keyed by path.
+    An entry is only used while the file's mtime and size are unchanged.
+    """
+    
+    def __init__(self, max_bytes: int, max_file_size: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.entries: 'OrderedDict[str, Tuple[int, int, bytes]]' = OrderedDict()
+        self.total = 0
+        self.lock = threading.Lock()
+    
+    def get(self, full_path: str,
+            st: Optional[os.stat_result] = None) -> Optional[bytes]:
+        """
+        Return the cached content if it is still current.
+        `st` is a fresh stat of full_path, if the caller already has one.
+        """
+        with self.lock:
+            entry = self.entries.get(full_path)
+        if entry is None:
+            return None
+        
+        if st is None:
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                return None
+        if (st.st_mtime_ns, st.st_size) != entry[:2]:
+            return None
+        with self.lock:
+            if full_path in self.entries:
+                self.entries.move_to_end(full_path)
+        return entry[2]
+    
+    def put(self, full_path: str, st: os.stat_result, content: bytes) -> None:
+        """Remember a file's content, evicting the least recently used."""
+        if len(content) > self.max_file_size:
+            return
+        with self.lock:
+            old = self.entries.pop(full_path, None)
+            if old is not None:
+                self.total -= len(old[2])
+            self.entries[full_path] = (st.st_mtime_ns, st.st_size, content)
+            self.total += len(content)
+            while self.total > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total -= len(evicted[2])
+
+FILE_CACHE = FileCache(max_bytes=64 * 1024 * 1024, max_file_size=1024 * 1024)
+
+# The current second and its HTTP date, replaced as one tuple so threads
+# never see a mismatched pair
+_http_date: Tuple[int, bytes] = (0, b'')
+
+def http_date() -> bytes:
+    """Return the current time as an HTTP date, formatted once a second."""
+    global _http_date
+    now = int(time.time())
+    cached = _http_date
+    if cached[0] != now:
+        cached = (now, email.utils.formatdate(now, usegmt=True).encode('ascii'))
+        _http_date = cached
+    return cached[1]
+
+# Worker processes that run CGI scripts, created on first use, and the
+# queue on which each of them reports its pid
+_cgi_pool: Optional[ProcessPoolExecutor] = None
+_cgi_pids: 'Optional[multiprocessing.queues.SimpleQueue]' = None
+_cgi_pool_lock = threading.Lock()
+
+# Compiled CGI scripts, cached in each worker by path and mtime
+_cgi_code: Dict[str, Tuple[int, CodeType]] = {}
+
+def report_cgi_worker(pids: 'multiprocessing.queues.SimpleQueue') -> None:
+    """Tell the server the pid of a newly started CGI worker."""
+    # Ctrl-C reaches the whole process group; the server stops its
+    # workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pids.put(os.getpid())
+
+def get_cgi_pool() -> ProcessPoolExecutor:
+    """Return the CGI worker pool, starting it if needed."""
+    global _cgi_pool, _cgi_pids
+    with _cgi_pool_lock:
+        if _cgi_pool is None:
+            # forkserver workers start from a clean, single-threaded parent
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+            else:
+                context = multiprocessing.get_context()
+            _cgi_pids = context.SimpleQueue()
+            _cgi_pool = ProcessPoolExecutor(max_workers=CGI_WORKERS,
+                                            mp_context=context,
+                                            initializer=report_cgi_worker,
+                                            initargs=(_cgi_pids,))
+        return _cgi_pool
+
+def recycle_cgi_pool(pool: ProcessPoolExecutor, kill: bool = True,
+                     wait: bool = False) -> None:
+    """
+    Retire a stuck or broken pool, so the next CGI request starts a fresh
+    one. With `kill`, its workers are killed first and any scripts still
+    running in it fail; a broken pool has already stopped its own.
+    With `wait`, return only once the pool has been cleaned up.
+    """
+    global _cgi_pool, _cgi_pids
+    with _cgi_pool_lock:
+        if _cgi_pool is not pool:
+            return  # Another request already replaced it
+        pids = _cgi_pids
+        _cgi_pool = _cgi_pids = None
+    
+    # A running call cannot be cancelled, only its process killed
+    while kill and not pids.empty():
+        try:
+            os.kill(pids.get(), getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except ProcessLookupError:
+            pass
+    pool.shutdown(wait=wait, cancel_futures=True)
+    pids.close()
+
+def close_cgi_pool() -> None:
+    """Stop the CGI pool at shutdown, killing scripts still running."""
+    pool = _cgi_pool
+    if pool is not None:
+        # Reap it now; a pool left half shut down trips up the
+        # executor's own exit handler
+        recycle_cgi_pool(pool, wait=True)
+
+def exec_cgi(full_path: str, spill_path: str) -> Optional[bytes]:
+    """Run a CGI script in a pool worker and return its output.
+
+    Output larger than CGI_MEMORY_LIMIT is written to spill_path instead,
+    so the caller can sendfile it, and None is returned. The caller picks
+    the name and removes the file, so it is not left behind if the worker
+    is killed.
+    """
+    mtime = os.stat(full_path).st_mtime_ns
+    cached = _cgi_code.get(full_path)
+    if cached is None or cached[0] != mtime:
+        with open(full_path, 'rb') as f:
+            cached = (mtime, compile(f.read(), full_path, 'exec'))
+        _cgi_code[full_path] = cached
+    
+    # Run the script as if it had been started with 'python full_path'
+    # from the server's directory: its own directory first on sys.path,
+    # and its argv, working directory and local imports undone after,
+    # so the next script in this worker starts from the same state
+    script_dir = os.path.dirname(full_path)
+    saved_argv, saved_path = sys.argv, sys.path[:]
+    saved_cwd, saved_modules = os.getcwd(), set(sys.modules)
+    sys.argv = [full_path]
+    sys.path[0] = script_dir
+    output = io.BytesIO()
+    stdout = io.TextIOWrapper(output, encoding='utf-8', write_through=True)
+    try:
+        with contextlib.redirect_stdout(stdout):
+            exec(cached[1], {'__name__': '__main__', '__file__': full_path})
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise ServerException(f"'{full_path}' exited with {e.code}")
+    finally:
+        sys.argv = saved_argv
+        sys.path[:] = saved_path
+        os.chdir(saved_cwd)
+        forget_local_modules(saved_modules, script_dir)
+        stdout.flush()
+        stdout.detach()
+    
+    if output.tell() <= CGI_MEMORY_LIMIT:
+        return output.getvalue()
+    
+    # O_EXCL: never write through a file or link someone else put there
+    fd = os.open(spill_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                 getattr(os, 'O_BINARY', 0), 0o600)
+    with open(fd, 'wb') as f:
+        f.write(output.getbuffer())
+    return None
+
+def forget_local_modules(keep: set, script_dir: str) -> None:
+    """
+    Drop modules a CGI script imported from its own directory, so the
+    next script sees its own neighbours and picks up edited files.
+    Library modules stay loaded; they are the same for every script.
+    """
+    prefix = os.path.join(script_dir, '')
+    for name in set(sys.modules) - keep:
+        path = getattr(sys.modules[name], '__file__', None) or ''
+        if path.startswith(prefix):
+            del sys.modules[name]
+
 class BaseCase:
     """Parent for all case handlers with common functionality."""
     
     def handle_file(self, handler: 'RequestHandler', full_path: str) -> None:
         try:
-            with open(full_path, 'rb') as reader:
-                content = reader.read()
-            handler.send_content(content)
-        except IOError as msg:
-            msg = f"'{full_path}' cannot be read: {msg}"
-            handler.handle_error(msg)
-
-    def index_path(self, handler: 'RequestHandler') -> str:
-        return os.path.join(handler.full_path, 'index.html')
+            handler.handle_file(full_path)
+        except ServerException as msg:
+            handler.handle_error(str(msg))
 
-    def test(self, handler: 'RequestHandler') -> bool:
+    def test(self, handler: 'RequestHandler',
+             st: Optional[os.stat_result]) -> bool:
         raise NotImplementedError('Subclasses must implement this method')
 
     def act(self, handler: 'RequestHandler') -> None:
@@ -31,8 +289,9 @@ class BaseCase:
 class CaseNoFile(BaseCase):
     """File or directory does not exist."""
     
-    def test(self, handler: 'RequestHandler') -> bool:
-        return not os.path.exists(handler.full_path)
+    def test(self, handler: 'RequestHandler',
+             st: Optional[os.stat_result]) -> bool:
+        return st is None
 
     def act(self, handler: 'RequestHandler') -> None:
         raise ServerException(f"'{handler.path}' not found")
@@ -40,8 +299,9 @@ class CaseNoFile(BaseCase):
 class CaseExistingFile(BaseCase):
     """File exists."""
     
-    def test(self, handler: 'RequestHandler') -> bool:
-        return os.path.isfile(handler.full_path)
+    def test(self, handler: 'RequestHandler',
+             st: Optional[os.stat_result]) -> bool:
+        return stat.S_ISREG(st.st_mode)
 
     def act(self, handler: 'RequestHandler') -> None:
         handler.handle_file(handler.full_path)
@@ -49,19 +309,21 @@ class CaseExistingFile(BaseCase):
 class CaseDirectoryIndexFile(BaseCase):
     """Serve index.html page for a directory."""
     
-    def test(self, handler: 'RequestHandler') -> bool:
-        return os.path.isdir(handler.full_path) and \
-               os.path.isfile(self.index_path(handler))
+    def test(self, handler: 'RequestHandler',
+             st: Optional[os.stat_result]) -> bool:
+        return stat.S_ISDIR(st.st_mode) and \
+               os.path.isfile(handler.index_path)
 
     def act(self, handler: 'RequestHandler') -> None:
-        handler.handle_file(self.index_path(handler))
+        handler.handle_file(handler.index_path)
 
 class CaseDirectoryNoIndexFile(BaseCase):
     """Serve listing for a directory without an index.html page."""
     
-    def test(self, handler: 'RequestHandler') -> bool:
-        return os.path.isdir(handler.full_path) and \
-               not os.path.isfile(self.index_path(handler))
+    def test(self, handler: 'RequestHandler',
+             st: Optional[os.stat_result]) -> bool:
+        return stat.S_ISDIR(st.st_mode) and \
+               not os.path.isfile(handler.index_path)
 
     def act(self, handler: 'RequestHandler') -> None:
         handler.list_dir(handler.full_path)
@@ -69,9 +331,10 @@ class CaseDirectoryNoIndexFile(BaseCase):
 class CaseCGIFile(BaseCase):
     """Execute CGI scripts."""
     
-    def test(self, handler: 'RequestHandler') -> bool:
-        return os.path.isfile(handler.full_path) and \
-               handler.full_path.endswith('.py')
+    def test(self, handler: 'RequestHandler',
+             st: Optional[os.stat_result]) -> bool:
+        return stat.S_ISREG(st.st_mode) and \
+               handler.full_path.endswith(CGI_SUFFIXES)
 
     def act(self, handler: 'RequestHandler') -> None:
         handler.run_cgi(handler.full_path)
@@ -79,65 +342,92 @@ class CaseCGIFile(BaseCase):
 class CaseAlwaysFail(BaseCase):
     """Base case if nothing else worked."""
     
-    def test(self, handler: 'RequestHandler') -> bool:
+    def test(self, handler: 'RequestHandler',
+             st: Optional[os.stat_result]) -> bool:
         return True
 
     def act(self, handler: 'RequestHandler') -> None:
         raise ServerException(f"Unknown object '{handler.path}'")
 
+# The default processing pipeline. A tuple, so it cannot be changed in
+# place; do_GET runs it from DISPATCH only while CASES is this object
+DEFAULT_CASES: Tuple[BaseCase, ...] = (
+    CaseNoFile(),
+    CaseCGIFile(),
+    CaseExistingFile(),
+    CaseDirectoryIndexFile(),
+    CaseDirectoryNoIndexFile(),
+    CaseAlwaysFail()
+)
+
 class RequestHandler(BaseHTTPRequestHandler):
     """
     Handle HTTP requests by returning files or directory listings.
     If anything goes wrong, an error page is constructed.
     """
     
-    # Define the processing pipeline
-    CASES: List[BaseCase] = [
-        CaseNoFile(),
-        CaseExistingFile(),
-        CaseDirectoryIndexFile(),
-        CaseDirectoryNoIndexFile(),
-        CaseCGIFile(),
-        CaseAlwaysFail()
-    ]
-    
-    # Template for error pages
-    ERROR_PAGE = """\
+    # Define the processing pipeline. do_GET dispatches the default
+    # pipeline through DISPATCH; replacing CASES, on a subclass or here,
+    # gets the full loop.
+    CASES: Sequence[BaseCase] = DEFAULT_CASES
+    
+    # The default pipeline as a table: (file type bits, is a CGI script)
+    # to the name of the method that serves it, called with the path and
+    # its stat result
+    DISPATCH: Dict[Tuple[int, bool], str] = {
+        (stat.S_IFREG, True): 'run_cgi',
+        (stat.S_IFREG, False): 'handle_file',
+        (stat.S_IFDIR, True): 'serve_dir',
+        (stat.S_IFDIR, False): 'serve_dir',
+    }
+    
+    # Status line and headers (version, status, reason, server, date,
+    # content type, content length)
+    RESPONSE_HEAD = (b"%b %d %b\r\n"
+                     b"Server: %b\r\n"
+                     b"Date: %b\r\n"
+                     b"Content-Type: %b\r\n"
+                     b"Content-Length: %d\r\n"
+                     b"\r\n")
+    
+    # Template for error pages (path, path, msg)
+    ERROR_PAGE = b"""\
 <html>
-<head><title>Error accessing {path}</title></head>
+<head><title>Error accessing %b</title></head>
 <body>
-<h1>Error accessing {path}</h1>
-<p>{msg}</p>
+<h1>Error accessing %b</h1>
+<p>%b</p>
 </body>
 </html>"""
     
-    # Template for directory listings
-    LISTING_PAGE = """\
+    # Template for directory listings (path, path, items)
+    LISTING_PAGE = b"""\
 <html>
-<head><title>Directory listing for {path}</title></head>
+<head><title>Directory listing for %b</title></head>
 <body>
-<h2>Directory listing for {path}</h2>
+<h2>Directory listing for %b</h2>
 <hr>
 <ul>
-{items}
+%b
 </ul>
 <hr>
 </body>
 </html>"""
     
     # Template for the root page
-    ROOT_PAGE = """\
+    # (date_time, client_host, client_port, command, path)
+    ROOT_PAGE = b"""\
 <html>
 <head><title>Server Info</title></head>
 <body>
 <h1>Server Information</h1>
 <table border="1">
 <tr><th>Header</th><th>Value</th></tr>
-<tr><td>Date and time</td><td>{date_time}</td></tr>
-<tr><td>Client host</td><td>{client_host}</td></tr>
-<tr><td>Client port</td><td>{client_port}</td></tr>
-<tr><td>Command</td><td>{command}</td></tr>
-<tr><td>Path</td><td>{path}</td></tr>
+<tr><td>Date and time</td><td>%b</td></tr>
+<tr><td>Client host</td><td>%b</td></tr>
+<tr><td>Client port</td><td>%d</td></tr>
+<tr><td>Command</td><td>%b</td></tr>
+<tr><td>Path</td><td>%b</td></tr>
 </table>
 </body>
 </html>"""
@@ -150,17 +440,36 @@ class RequestHandler(BaseHTTPRequestHandler):
                 return
             
             # Resolve the full filesystem path
-            self.full_path = os.path.abspath(os.getcwd() + self.path)
+            self.full_path = os.path.normpath(DOCROOT + self.path)
             
             # Security check: prevent directory traversal
-            if not self.full_path.startswith(os.getcwd()):
+            if not self.full_path.startswith(DOCROOT_SEP) and \
+               self.full_path != DOCROOT:
                 raise ServerException("Attempted directory traversal")
+            self.index_path = self.full_path + INDEX_SUFFIX
+            
+            # Stat once; every case tests against the cached result
+            try:
+                st = os.stat(self.full_path)
+            except OSError:
+                st = None
             
-            # Process the request through the case handlers
-            for case in self.CASES:
-                if case.test(self):
-                    case.act(self)
-                    break
+            # Process the request through custom case handlers
+            if self.CASES is not DEFAULT_CASES:
+                for case in self.CASES:
+                    if case.test(self, st):
+                        case.act(self)
+                        break
+                return
+            
+            # Default pipeline, one table lookup on the stat bits
+            if st is None:
+                raise ServerException(f"'{self.path}' not found")
+            action = self.DISPATCH.get((stat.S_IFMT(st.st_mode),
+                                        self.full_path.endswith(CGI_SUFFIXES)))
+            if action is None:
+                raise ServerException(f"Unknown object '{self.path}'")
+            getattr(self, action)(self.full_path, st)
                     
         except ServerException as msg:
             self.handle_error(str(msg), 404)
@@ -171,122 +480,524 @@ class RequestHandler(BaseHTTPRequestHandler):
         """Handle POST requests."""
         try:
             content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length)
             
             # Process the POST data (example only - add your logic here)
-            response = b"Received: " + post_data
+            prefix = b"Received: "
+            
+            # Large bodies are echoed in chunks as they arrive
+            if content_length > COALESCE_LIMIT:
+                self.stream_post(prefix, content_length)
+                return
             
-            self.send_response(200)
-            self.send_header("Content-Type", "text/plain")
-            self.send_header("Content-Length", str(len(response)))
-            self.end_headers()
-            self.wfile.write(response)
+            # Read the body straight in behind the prefix, so it is not
+            # copied again to build the response
+            response = bytearray(len(prefix) + content_length)
+            response[:len(prefix)] = prefix
+            with memoryview(response) as view:
+                n = self.rfile.readinto(view[len(prefix):])
+            del response[len(prefix) + n:]
+            
+            self.send_content(response, content_type=b"text/plain")
         except Exception as e:
             self.handle_error(f"Error processing POST: {str(e)}", 500)
     
+    def stream_post(self, prefix: bytes, content_length: int) -> None:
+        """Send the prefix and then the request body, one buffer at a time."""
+        head = self.build_head(200, b"text/plain", len(prefix) + content_length)
+        buf = bytearray(BUF_SIZE)
+        try:
+            self.wfile.write(head + prefix)
+            with memoryview(buf) as view:
+                remaining = content_length
+                while remaining:
+                    n = self.rfile.readinto(view[:min(remaining, BUF_SIZE)])
+                    if not n:
+                        # The client hung up; the response cannot be
+                        # completed
+                        self.close_connection = True
+                        return
+                    self.wfile.write(view[:n])
+                    remaining -= n
+        except OSError as e:
+            self.abort_response(e)
+    
     def send_root_page(self) -> None:
         """Generate and send the root info page."""
-        values = {
-            'date_time': self.date_time_string(),
-            'client_host': self.client_address[0],
-            'client_port': self.client_address[1],
-            'command': self.command,
-            'path': self.path
-        }
-        page = self.ROOT_PAGE.format(**values).encode('utf-8')
+        page = self.ROOT_PAGE % (
+            http_date(),
+            self.client_address[0].encode('utf-8'),
+            self.client_address[1],
+            self.command.encode('utf-8'),
+            self.path.encode('utf-8')
+        )
         self.send_content(page)
     
-    def handle_file(self, full_path: str) -> None:
-        """Handle file requests with proper MIME types."""
+    def handle_file(self, full_path: str,
+                    st: Optional[os.stat_result] = None) -> None:
+        """
+        Handle file requests with proper MIME types.
+        `st` is the stat do_GET already made of full_path, if any.
+        """
+        # Simple MIME type detection
+        content_type = MIME_TYPES.get(
+            os.path.splitext(full_path)[1].lower(), b"text/plain")
+        
+        content = FILE_CACHE.get(full_path, st)
+        if content is not None:
+            self.send_content(content, content_type=content_type)
+            return
+        
+        # A bare descriptor skips the fstat/ioctl/lseek calls that
+        # setting up a buffered file object costs on every request
+        try:
+            fd = os.open(full_path, OPEN_FLAGS)
+        except OSError:
+            raise ServerException(f"Cannot read file: {full_path}")
         try:
-            with open(full_path, 'rb') as f:
-                content = f.read()
+            st = os.fstat(fd)
+            size = st.st_size
             
-            # Simple MIME type detection
-            if full_path.endswith(".html"):
-                content_type = "text/html"
-            elif full_path.endswith(".css"):
-                content_type = "text/css"
-            elif full_path.endswith(".js"):
-                content_type = "application/javascript"
-            elif full_path.endswith(".png"):
-                content_type = "image/png"
-            elif full_path.endswith(".jpg") or full_path.endswith(".jpeg"):
-                content_type = "image/jpeg"
-            else:
-                content_type = "text/plain"
+            # Small files are read once and then served from memory
+            if size <= FILE_CACHE.max_file_size:
+                content = os.read(fd, size)
+                FILE_CACHE.put(full_path, st, content)
+                self.send_content(content, content_type=content_type)
+                return
             
-            self.send_response(200)
-            self.send_header("Content-Type", content_type)
-            self.send_header("Content-Length", str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
-        except IOError:
-            raise ServerException(f"Cannot read file: {full_path}")
+            # Very large files are read around the page cache
+            if size > DIRECT_IO_MIN:
+                direct_fd = self.open_direct(full_path)
+                if direct_fd is not None:
+                    try:
+                        self.send_fd(direct_fd, size, content_type,
+                                     direct=True)
+                    finally:
+                        os.close(direct_fd)
+                    return
+            
+            # Ask the kernel to read ahead aggressively so disk reads
+            # overlap with writes to the socket
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, size, os.POSIX_FADV_SEQUENTIAL)
+            
+            self.send_fd(fd, size, content_type)
+        finally:
+            os.close(fd)
+    
+    def open_direct(self, full_path: str) -> Optional[int]:
+        """
+        Open a file for direct I/O, or return None where the platform or
+        filesystem (e.g. tmpfs) does not support it.
+        """
+        if not hasattr(os, 'O_DIRECT'):
+            return None
+        try:
+            return os.open(full_path, OPEN_FLAGS | os.O_DIRECT)
+        except OSError as e:
+            if e.errno in (errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP):
+                return None
+            raise
+    
+    def send_fd(self, fd: int, size: int, content_type: bytes,
+                direct: bool = False) -> None:
+        """
+        Send an open file as a complete 200 response.
+        If sending fails partway, the connection is closed instead.
+        """
+        # Cork so the headers share a segment with the start of the body
+        self.set_cork(True)
+        try:
+            self.wfile.write(self.build_head(200, content_type, size))
+            self.send_file_body(fd, size, direct)
+        except OSError as e:
+            self.abort_response(e)
+        finally:
+            self.set_cork(False)
+    
+    def abort_response(self, error: OSError) -> None:
+        """
+        Give up on a response that failed partway. Part of it may already
+        be out, so an error page can no longer be sent; the connection
+        is dropped instead.
+        """
+        self.log_error("Response to %r aborted: %s", self.path, error)
+        self.close_connection = True
+    
+    def set_cork(self, corked: bool) -> None:
+        """Turn TCP corking on or off; uncorking flushes what is pending."""
+        if TCP_CORK is None:
+            return
+        try:
+            self.request.setsockopt(socket.IPPROTO_TCP, TCP_CORK, int(corked))
+        except OSError:
+            pass
+    
+    def send_file_body(self, fd: int, size: int, direct: bool = False) -> None:
+        """
+        Copy a file to the socket, letting the kernel do it when possible.
+        `direct` says fd was opened with O_DIRECT and needs aligned reads.
+        """
+        offset = 0
+        if hasattr(os, 'sendfile'):
+            out_fd = self.wfile.fileno()
+            try:
+                # Zero-copy: file pages go straight to the socket
+                while offset < size:
+                    sent = os.sendfile(out_fd, fd, offset, size - offset)
+                    if sent == 0:
+                        return
+                    offset += sent
+                return
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+        
+        # sendfile is not available for this fd pair; copy in fixed chunks.
+        # Direct reads need a page-aligned buffer (an anonymous mmap is
+        # one) and an aligned offset, so any bytes already sent are skipped.
+        skip = offset % DIRECT_IO_ALIGN if direct else 0
+        with open(fd, 'rb', buffering=0, closefd=False) as f, \
+             (mmap.mmap(-1, BUF_SIZE) if direct else
+              contextlib.nullcontext(bytearray(BUF_SIZE))) as buf:
+            f.seek(offset - skip)
+            with memoryview(buf) as view:
+                while True:
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    self.wfile.write(view[skip:n])
+                    skip = 0
+    
+    def serve_dir(self, full_path: str,
+                  st: Optional[os.stat_result] = None) -> None:
+        """Serve a directory's index.html page, or else list it."""
+        if os.path.isfile(self.index_path):
+            self.handle_file(self.index_path)
+        else:
+            self.list_dir(full_path)
     
     def list_dir(self, full_path: str) -> None:
         """Generate directory listing."""
         try:
-            entries = sorted(os.listdir(full_path))
-            items = []
+            with os.scandir(full_path) as it:
+                entries = sorted((e for e in it if not e.name.startswith('.')),
+                                 key=lambda e: e.name)  # Skip hidden files
+            path = self.path.encode('utf-8')
+            prefix = path if path.endswith(b'/') else path + b'/'
             
+            # Grow one buffer instead of formatting a bytes per entry
+            items = bytearray()
+            append = items.extend
             for entry in entries:
-                if not entry.startswith('.'):  # Skip hidden files
-                    link = os.path.join(self.path, entry)
-                    items.append(f'<li><a href="{link}">{entry}</a></li>')
+                name = entry.name.encode('utf-8')
+                append(b'<li><a href="')
+                append(prefix)
+                append(name)
+                append(b'">')
+                append(name)
+                append(b'</a></li>\n')
+            del items[-1:]  # The template supplies the final newline
             
-            page = self.LISTING_PAGE.format(
-                path=self.path,
-                items='\n'.join(items)
-            ).encode('utf-8')
+            page = self.LISTING_PAGE % (path, path, items)
             
             self.send_content(page)
         except OSError as msg:
             raise ServerException(f"'{self.path}' cannot be listed: {msg}")
     
-    def run_cgi(self, full_path: str) -> None:
+    def run_cgi(self, full_path: str,
+                st: Optional[os.stat_result] = None) -> None:
         """Execute CGI scripts securely."""
+        # Running the server's own file would start a second server
+        # inside the worker
+        if os.path.samestat(st or os.stat(full_path), os.stat(__file__)):
+            raise ServerException(f"'{self.path}' cannot be run")
+        
+        # Named here but only created by the worker for large output
+        spill_path = os.path.join(tempfile.gettempdir(),
+                                  f'cgi-{os.urandom(8).hex()}')
+        spilled = True  # Until the worker says otherwise
         try:
-            # Use subprocess for better security than os.popen2
-            result = subprocess.run(
-                ['python', full_path],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            self.send_content(result.stdout.encode('utf-8'))
-        except subprocess.CalledProcessError as e:
-            self.handle_error(f"CGI script error: {e.stderr}", 500)
-        except Exception as e:
-            self.handle_error(f"Error running CGI: {str(e)}", 500)
+            try:
+                # Run in a warm worker instead of starting a new interpreter
+                pool = get_cgi_pool()
+                output = pool.submit(exec_cgi, full_path, spill_path).result(
+                    timeout=CGI_TIMEOUT)
+            except TimeoutError:
+                # The worker is still busy with the script; take it down
+                # so hung scripts do not use up the pool
+                recycle_cgi_pool(pool)
+                self.handle_error("CGI script timed out", 500)
+                return
+            except BrokenProcessPool as e:
+                # A worker died (os._exit, a crash, the OOM killer) and
+                # the pool refuses further work; start over with a new one
+                recycle_cgi_pool(pool, kill=False)
+                self.handle_error(f"CGI script error: {str(e)}", 500)
+                return
+            except Exception as e:
+                self.handle_error(f"CGI script error: {str(e)}", 500)
+                return
+            
+            if output is not None:
+                spilled = False
+                self.send_content(output)
+                return
+            
+            # Hand the spilled output to the socket without reading it back
+            try:
+                fd = os.open(spill_path, OPEN_FLAGS)
+            except OSError as e:
+                self.handle_error(f"Error sending CGI output: {str(e)}", 500)
+                return
+            try:
+                self.send_fd(fd, os.fstat(fd).st_size, b"text/html")
+            finally:
+                os.close(fd)
+        finally:
+            if spilled:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(spill_path)
     
     def handle_error(self, msg: str, status: int = 404) -> None:
         """Send error page with appropriate status code."""
-        page = self.ERROR_PAGE.format(
-            path=self.path,
-            msg=msg
-        ).encode('utf-8')
+        path = self.path.encode('utf-8')
+        page = self.ERROR_PAGE % (path, path, msg.encode('utf-8'))
         
-        self.send_response(status)
-        self.send_header("Content-Type", "text/html")
-        self.send_header("Content-Length", str(len(page)))
-        self.end_headers()
-        self.wfile.write(page)
+        self.send_content(page, status)
     
-    def send_content(self, content: bytes, status: int = 200) -> None:
+    def send_content(self, content: bytes, status: int = 200,
+                     content_type: bytes = b"text/html") -> None:
         """Send content with proper headers."""
-        self.send_response(status)
-        self.send_header("Content-Type", "text/html")
-        self.send_header("Content-Length", str(len(content)))
-        self.end_headers()
-        self.wfile.write(content)
+        head = self.build_head(status, content_type, len(content))
+        try:
+            if len(content) <= COALESCE_LIMIT:
+                self.wfile.write(head + content)
+            elif hasattr(os, 'writev'):
+                self.writev_all([memoryview(head), memoryview(content)])
+            else:
+                self.wfile.write(head)
+                self.wfile.write(content)
+        except OSError as e:
+            self.abort_response(e)
+    
+    def build_head(self, status: int, content_type: bytes,
+                   length: int) -> bytes:
+        """
+        Build the status line and headers in one piece, so a response
+        costs a single write instead of one per header.
+        """
+        self.log_request(status)
+        if self.request_version == 'HTTP/0.9':
+            return b''
+        return self.RESPONSE_HEAD % (
+            self.protocol_version.encode('latin-1'),
+            status,
+            self.responses.get(status, ('',))[0].encode('latin-1'),
+            self.version_string().encode('latin-1'),
+            http_date(),
+            content_type,
+            length
+        )
+    
+    def writev_all(self, views: List[memoryview]) -> None:
+        """Write every buffer to the socket using writev(2)."""
+        out_fd = self.wfile.fileno()
+        while views:
+            sent = os.writev(out_fd, views)
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if views:
+                views[0] = views[0][sent:]
+
+# An accepted socket and the client's address
+Connection = Tuple[socket.socket, Tuple[str, int]]
+
+class ThreadPoolHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP server that handles requests on a bounded pool of threads.
+    Accepted connections are parked on a selector until the client has
+    sent something, so idle clients do not tie up a worker. A client
+    that stalls partway through its request still holds one. Workers are
+    daemon threads, as in ThreadingHTTPServer, so such a client cannot
+    keep the process alive after shutdown.
+    """
+    
+    def __init__(self, server_address: Tuple[str, int],
+                 handler_class: Type[BaseHTTPRequestHandler],
+                 max_workers: int, reuse_port: bool = False) -> None:
+        # A lone server should fail with EADDRINUSE rather than share its
+        # port with a stray copy
+        self.reuse_port = reuse_port
+        self.max_workers = max_workers
+        self.ready: 'queue.SimpleQueue[Optional[Connection]]' = \
+            queue.SimpleQueue()
+        self.selector = selectors.DefaultSelector()
+        self.parked: Deque[Connection] = deque()
+        self.closing = threading.Event()
+        self.poller: Optional[threading.Thread] = None
+        
+        # Lets the accept thread interrupt the poller's select()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ)
+        
+        # Binds last, so server_close can clean up if that fails
+        super().__init__(server_address, handler_class)
+    
+    def server_bind(self) -> None:
+        # Let preforked siblings bind the same port; the kernel then
+        # spreads incoming connections across their sockets
+        if self.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+    
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        for _ in range(self.max_workers):
+            threading.Thread(target=self.work, daemon=True).start()
+        self.poller = threading.Thread(target=self.poll_connections,
+                                       daemon=True)
+        self.poller.start()
+        super().serve_forever(poll_interval)
+    
+    def work(self) -> None:
+        """Serve connections the poller found readable, until told to stop."""
+        while True:
+            item = self.ready.get()
+            if item is None:
+                return
+            self.process_request_thread(*item)
+    
+    def process_request(self, request, client_address) -> None:
+        """Park the connection until its request arrives."""
+        self.parked.append((request, client_address))
+        self.wakeup_w.send(b'\0')
+    
+    def poll_connections(self) -> None:
+        """Hand connections that became readable to the worker threads."""
+        while not self.closing.is_set():
+            try:
+                events = self.selector.select()
+            except OSError as e:
+                # Back off briefly rather than spin on a persistent error
+                print(f"Connection poller: {e}", file=sys.stderr)
+                self.closing.wait(0.1)
+                continue
+            
+            for key, _ in events:
+                if key.fileobj is self.wakeup_r:
+                    self.wakeup_r.recv(4096)
+                    while self.parked:
+                        self.park(*self.parked.popleft())
+                    continue
+                try:
+                    self.selector.unregister(key.fileobj)
+                    self.ready.put((key.fileobj, key.data))
+                except Exception:
+                    self.handle_error(key.fileobj, key.data)
+                    self.shutdown_request(key.fileobj)
+    
+    def park(self, request: socket.socket,
+             client_address: Tuple[str, int]) -> None:
+        """Watch a connection; one that cannot be watched is dropped."""
+        try:
+            self.selector.register(request, selectors.EVENT_READ,
+                                   client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+    
+    def server_close(self) -> None:
+        super().server_close()
+        self.closing.set()
+        self.wakeup_w.send(b'\0')
+        if self.poller is not None:
+            self.poller.join()
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+        self.wakeup_w.close()
+        
+        # Idle workers exit; busy ones die with the process
+        for _ in range(self.max_workers):
+            self.ready.put(None)
+
+def prefork(processes: int) -> List[int]:
+    """
+    Fork until there are `processes` server processes.
+    Returns the children's pids in the parent and [] in each child.
+    """
+    children = []
+    for _ in range(processes - 1):
+        pid = os.fork()
+        if pid == 0:
+            return []
+        children.append(pid)
+    return children
+
+# Set once the first SIGINT or SIGTERM has started the shutdown
+_stopping = False
+
+def stop_serving(signum, frame) -> None:
+    """
+    Shut down on SIGTERM the same way as on Ctrl-C. Later signals do
+    nothing, so they cannot interrupt the shutdown itself.
+    """
+    global _stopping
+    if not _stopping:
+        _stopping = True
+        raise KeyboardInterrupt
 
 if __name__ == '__main__':
     server_address = ('localhost', 8000)
-    server = HTTPServer(server_address, RequestHandler)
-    print(f"Serving on http://{server_address[0]}:{server_address[1]}")
+    
+    # Size the pool for I/O-bound work; override with WEB_SERVER_THREADS
+    threads = int(os.environ.get('WEB_SERVER_THREADS', 0)) or \
+              (os.cpu_count() or 1) + 2
+    
+    # One process per core, each with its own SO_REUSEPORT listening
+    # socket; override with WEB_SERVER_PROCESSES
+    processes = int(os.environ.get('WEB_SERVER_PROCESSES', 0)) or \
+                os.cpu_count() or 1
+    if not hasattr(os, 'fork') or not hasattr(socket, 'SO_REUSEPORT'):
+        processes = 1
+    
+    # Share the cores among the processes' CGI pools
+    CGI_WORKERS = max(1, (os.cpu_count() or 1) // processes)
+    
+    signal.signal(signal.SIGINT, stop_serving)
+    signal.signal(signal.SIGTERM, stop_serving)
+    main_pid = os.getpid()
+    children = prefork(processes)
+    is_main = os.getpid() == main_pid
+    
+    server = ThreadPoolHTTPServer(server_address, RequestHandler, threads,
+                                  reuse_port=processes > 1)
+    if is_main:
+        print(f"Serving on http://{server_address[0]}:{server_address[1]} "
+              f"with {processes} processes of {threads} threads")
     try:
         server.serve_forever()
     except KeyboardInterrupt:
-        print("\nShutting down server...")
-        server.server_close()
\ No newline at end of file
+        if is_main:
+            print("\nShutting down server...")
+    finally:
+        _stopping = True
+        server.server_close()
+        
+        # Kill scripts still running, or the pool would wait for them
+        close_cgi_pool()
+    
+    # Take the other server processes down with this one. Ctrl-C in a
+    # terminal has already signalled them all; only those still
+    # serving need telling
+    serving = [pid for pid in children if os.waitpid(pid, os.WNOHANG)[0] == 0]
+    for pid in serving:
+        os.kill(pid, signal.SIGTERM)
+    for pid in serving:
+        os.waitpid(pid, 0)
+    
+    # The interpreter restores default signal handling while it exits;
+    # keep a late Ctrl-C from killing it before output is flushed
+    if hasattr(signal, 'pthread_sigmask'):
+        signal.pthread_sigmask(signal.SIG_BLOCK,
+                               {signal.SIGINT, signal.SIGTERM})
\ No newline at end of file